@@ -3,6 +3,7 @@ from datetime import datetime
 from toolbox.io import one_of
 from toolbox.io import write_std_header, write_data, write_runtime
 
+import exp.counters as counters
 import exp.rtas18
 
 experiment_modules = [
@@ -39,9 +40,12 @@ def run_config(conf):
     experiment_driver = EXPERIMENTS[conf.experiment]
 
     write_std_header(conf.output, conf=conf)
+    counters.reset()
+    counters.enable(bool(int(conf.get('statistics', 0))))
     start  = datetime.now()
     experiment_driver(conf)
     end = datetime.now()
 
+    counters.write_counters(conf.output)
     write_runtime(conf.output, start, end)
     return end - start
@@ -10,16 +10,26 @@ import numpy
 
 from toolbox.io import load_config, atomic_create_file, ensure_dir_exists
 from exp import run_config, CONFIG_GENERATORS
+from exp.checkpoint import checkpoint_exists, discard_checkpoint
 
 def process_file(label, fname, overwrite, samples=None):
     random.seed()
     numpy.random.seed()
     try:
         config = load_config(fname)
+        if 'seed' in config:
+            # reproducible runs (see also exp.rtas18.sample_seeds())
+            random.seed(int(config.seed))
+            numpy.random.seed(int(config.seed))
         if samples:
             config.samples = samples
         ensure_dir_exists(config.output_file)
         if overwrite:
+            discard_checkpoint(config.output_file)
+            config.output = open(config.output_file, 'w')
+        elif checkpoint_exists(config.output_file):
+            # an interrupted run: resume it (see exp/checkpoint.py)
+            print "%s resuming %s from its checkpoint." % (label, fname)
             config.output = open(config.output_file, 'w')
         else:
             config.output = atomic_create_file(config.output_file)
@@ -1,12 +1,17 @@
 from __future__ import division
 import copy
+import itertools
 import random
+from collections import OrderedDict
+
+import numpy
 
 from schedcat.model.tasks import SporadicTask, TaskSystem
 import schedcat.locking.bounds as bounds
 import schedcat.sched.fp as fp
 
 from overhead import *
+import counters
 
 def dbg_human_print(taskset, max_cpu):    
     for cpuid in range(0, int(max_cpu)):
@@ -27,16 +32,263 @@ def dbg_human_print(taskset, max_cpu):
     print "------------------------------------------"
     print "------------------------------------------"
 
+class PartitionIndex(object):
+    """The tasks of a task set grouped into one TaskSystem per partition.
+
+    The index is cached on the task set (see partition_index()) and stays
+    valid across analysis rounds, since the analyses only change the
+    scheduling parameters of the tasks, never their partition.  Adding or
+    removing tasks rebuilds it; code that moves a task to another partition
+    or reorders the task set must call invalidate_partition_index().
+    """
+    def __init__(self, taskset):
+        self.size = len(taskset)
+        partitions = {}
+        for t in taskset:
+            if t.partition not in partitions:
+                partitions[t.partition] = []
+            partitions[t.partition].append(t)
+        self.partitions = [TaskSystem(p) for p in partitions.itervalues()]
+
+    def is_valid_for(self, taskset):
+        return self.size == len(taskset)
+
+def partition_index(taskset):
+    """ Return the (cached) PartitionIndex of taskset. """
+    index = taskset.__dict__.get('partition_index')
+    if index is None or not index.is_valid_for(taskset):
+        index = PartitionIndex(taskset)
+        taskset.partition_index = index
+    return index
+
+def invalidate_partition_index(taskset):
+    """ Drop the PartitionIndex of taskset after its partitions changed. """
+    taskset.__dict__.pop('partition_index', None)
+
 def iter_partitions_ts(taskset):
     """ Generate a Taskset for every partition. """
-    partitions = {}
-    for t in taskset:
-        if t.partition not in partitions:
-            partitions[t.partition] = []
-        partitions[t.partition].append(t)
-    for p in partitions.itervalues():
-        yield TaskSystem(p)
+    return iter(partition_index(taskset).partitions)
         
+def analysis_task(task):
+    """Per-test overlay of a generated task.
+
+    The overlay starts with the attributes of task (the resource model and
+    other nested objects are shared, not copied) and receives every
+    attribute the analysis assigns (cost, response_time, blocked, ...).
+    The generated task thus stays read-only and can be shared by all tests
+    of a sample.
+    """
+    t = task.__class__.__new__(task.__class__)
+    t.__dict__.update(task.__dict__)
+    return t
+
+def analysis_view(taskset):
+    """ Return a TaskSystem of fresh overlays of the tasks in taskset. """
+    view = TaskSystem([analysis_task(t) for t in taskset])
+    view.bounds_token = taskset_token(taskset)
+    return view
+
+_taskset_tokens = itertools.count(1)
+
+def taskset_token(taskset):
+    """Identity of the generated taskset behind taskset.
+
+    Unlike id(), a token is never reused by a later taskset, so it can key
+    results that outlive the taskset (see BoundsCache).
+    """
+    token = taskset.__dict__.get('bounds_token')
+    if token is None:
+        token = next(_taskset_tokens)
+        taskset.bounds_token = token
+    return token
+
+# Number of bounds results kept by BOUNDS_CACHE; 0 disables the cache.
+BOUNDS_CACHE_SIZE = 256
+
+class BoundsCache(object):
+    """LRU memo of the (LP based) blocking bounds.
+
+    The fixed-point iterations re-run the blocking analysis with response-time
+    vectors they have already seen: every binary-search probe of the
+    quiescence period or the MC reader period restarts from the same
+    initial vector, and the final verification repeats a probe. An entry is
+    keyed on the taskset token, the bound and the per-task inputs of the
+    bound (cost, period, deadline, response times, partition, preemption
+    level and resource requests) and stores the per-task attributes the
+    bound assigned, which a hit replays.
+    """
+    # Attributes always replayed, even if the bound left them unchanged.
+    OUTPUTS = ('blocked', 'cost')
+
+    def __init__(self, size=BOUNDS_CACHE_SIZE):
+        self.size = size
+        self.entries = OrderedDict()
+
+    def key(self, apply, ts, args):
+        return (taskset_token(ts), apply.__name__, args,
+                tuple((t.cost, t.period, t.deadline, t.response_time,
+                       t.__dict__.get('read_response_time'),
+                       t.__dict__.get('partition'),
+                       t.__dict__.get('preemption_level'),
+                       BoundsCache.requests(t))
+                      for t in ts))
+
+    @staticmethod
+    def requests(task):
+        """ The request counts and lengths of the resource model of task. """
+        resmodel = task.__dict__.get('resmodel') or {}
+        return tuple(sorted((res_id, r.max_reads, r.max_writes,
+                             r.max_read_length, r.max_write_length)
+                            for (res_id, r) in resmodel.iteritems()))
+
+    def apply(self, apply, ts, *args):
+        if self.size <= 0:
+            apply(ts, *args)
+            return
+        key = self.key(apply, ts, args)
+        terms = self.entries.pop(key, None)
+        if terms is not None:
+            counters.count('bounds-cache.hits')
+            for (t, values) in zip(ts, terms):
+                t.__dict__.update(values)
+        else:
+            counters.count('bounds-cache.misses')
+            before = [dict(t.__dict__) for t in ts]
+            apply(ts, *args)
+            terms = [self.assigned(old, t.__dict__) for (old, t) in zip(before, ts)]
+            while len(self.entries) >= self.size:
+                self.entries.popitem(last=False)
+        self.entries[key] = terms
+
+    def assigned(self, old, new):
+        values = dict((k, new[k]) for k in self.OUTPUTS if k in new)
+        for k in new:
+            if k not in old or old[k] is not new[k]:
+                values[k] = new[k]
+        return values
+
+    def clear(self):
+        self.entries.clear()
+
+BOUNDS_CACHE = BoundsCache()
+
+def cached_bounds(apply, ts, *args):
+    """ Apply the blocking bound apply to ts through BOUNDS_CACHE. """
+    BOUNDS_CACHE.apply(apply, ts, *args)
+
+# Pre-filters: O(n) checks that settle a sample before the exact analysis
+# of a test. A filter returns 1 (schedulable), 0 (unschedulable) or None
+# (undecided). Tests opt in by calling prefilter() on their charged
+# taskset with the filters that are sound for them. On a generated taskset
+# that keeps its TaskArray (see TaskArray.to_taskset()), the filters
+# evaluate the arrays, all partitions at once, with the same arithmetic.
+
+def task_array(taskset):
+    """ The TaskArray taskset was built from, or None. """
+    return taskset.__dict__.get('task_array')
+
+def partition_matrix(taskset):
+    """ The partition matrix of the TaskArray of taskset, if any. """
+    arr = task_array(taskset)
+    return arr.partition_matrix() if arr is not None else None
+
+def overload_filter(taskset):
+    """Necessary condition for every test: blocking and the SMR terms only
+    add to the charged costs, so a task with cost > deadline or a partition
+    with utilization > 1 is unschedulable."""
+    arr = task_array(taskset)
+    if arr is not None:
+        if (arr.cost > arr.deadline).any() or (arr.partition_utilization() > 1).any():
+            return 0
+        return None
+    for ts in iter_partitions_ts(taskset):
+        u = 0
+        for t in ts:
+            if t.cost > t.deadline:
+                return 0
+            u += t.cost / t.period
+        if u > 1:
+            return 0
+    return None
+
+def hyperbolic_filter(taskset):
+    """Hyperbolic bound of rate-monotonic scheduling without blocking (it
+    dominates the Liu and Layland bound): prod(U_i + 1) <= 2 on every
+    partition. Only decides partitions with implicit deadlines and
+    rate-monotonic priorities."""
+    matrix = partition_matrix(taskset)
+    if matrix is not None:
+        arr = task_array(taskset)
+        if (arr.deadline != arr.period).any():
+            return None
+        period = arr.period[matrix]
+        if (period[:, 1:] < period[:, :-1]).any():
+            return None
+        if (numpy.multiply.reduce(arr.utilization()[matrix] + 1, axis=1) > 2).any():
+            return None
+        return 1
+    for ts in iter_partitions_ts(taskset):
+        prod = 1
+        last = 0
+        for t in ts:
+            if t.deadline != t.period or t.period < last:
+                return None
+            last = t.period
+            prod *= t.cost / t.period + 1
+        if prod > 2:
+            return None
+    return 1
+
+def response_time_bound_filter(taskset):
+    """Closed-form upper bound of the fixed-priority response time without
+    blocking (Bini, Nguyen, Richard and Baruah):
+    R_i <= (C_i + sum_hp C_j (1 - U_j)) / (1 - sum_hp U_j)."""
+    matrix = partition_matrix(taskset)
+    if matrix is not None:
+        arr = task_array(taskset)
+        cost = arr.cost[matrix]
+        u = cost / arr.period[matrix]
+        # the sums over the higher-priority tasks of every partition
+        zero = numpy.zeros((len(matrix), 1))
+        hp_u = numpy.cumsum(numpy.hstack((zero, u[:, :-1])), axis=1)
+        hp_c = numpy.cumsum(numpy.hstack((zero, (cost * (1 - u))[:, :-1])), axis=1)
+        if (hp_u >= 1).any():
+            return None
+        if ((cost + hp_c) / (1 - hp_u) > arr.deadline[matrix]).any():
+            return None
+        return 1
+    for ts in iter_partitions_ts(taskset):
+        hp_u = 0
+        hp_c = 0
+        for t in ts:
+            if hp_u >= 1:
+                return None
+            if (t.cost + hp_c) / (1 - hp_u) > t.deadline:
+                return None
+            u = t.cost / t.period
+            hp_c += t.cost * (1 - u)
+            hp_u += u
+    return 1
+
+# Filters sound for any test (after overhead charging) ...
+REJECT_FILTERS = (overload_filter,)
+# ... and for tests without blocking.
+NO_BLOCKING_FILTERS = (overload_filter, hyperbolic_filter, response_time_bound_filter)
+
+def prefilter(test, taskset, filters):
+    """Run filters on taskset until one decides; return its verdict or None.
+
+    The hits and misses are counted per test (prefilter.<test>.hits), so the
+    output shows how often the exact analysis of test was avoided.
+    """
+    for f in filters:
+        r = f(taskset)
+        if r is not None:
+            counters.count('prefilter.%s.hits' % test.__name__)
+            return r
+    counters.count('prefilter.%s.misses' % test.__name__)
+    return None
+
 def fp_schedulable_without_qui(taskset):
     for ts in iter_partitions_ts(taskset):
         if not fp.is_schedulable(1, ts):
@@ -52,7 +304,10 @@ def response_times_consistent(tasks):
 	
 def no_blocking_test(taskset_in, oh, conf):
 	mem = 0
-	ts = copy.deepcopy(taskset_in)
+	# nothing is charged: filter the generated taskset (and its TaskArray)
+	r = prefilter(no_blocking_test, taskset_in, NO_BLOCKING_FILTERS)
+	if r is not None: return (r, mem)
+	ts = analysis_view(taskset_in)
 	for t in ts:
 		t.response_time = t.cost
 	if fp_schedulable_without_qui(ts): return (1, mem)
@@ -60,8 +315,9 @@ def no_blocking_test(taskset_in, oh, conf):
 	
 def spinlock_naive_test(taskset_in, oh, conf):
 	mem = 0
-	ts = copy.deepcopy(taskset_in)
+	ts = analysis_view(taskset_in)
 	charge_spinlock_overheads(oh, ts, conf)
+	if prefilter(spinlock_naive_test, ts, REJECT_FILTERS) == 0: return (0, mem)
 	for t in ts:
 		t.uninflated_cost = t.cost
 		t.response_time = t.cost
@@ -81,8 +337,9 @@ def spinlock_naive_test(taskset_in, oh, conf):
 
 def spinlock_ilp_test(taskset_in, oh, conf, oh_scale=1):
 	mem = 0
-	ts = copy.deepcopy(taskset_in)
+	ts = analysis_view(taskset_in)
 	charge_spinlock_overheads(oh, ts, conf, oh_scale)
+	if prefilter(spinlock_ilp_test, ts, REJECT_FILTERS) == 0: return (0, mem, None)
 	# response-time and blocking initialization
 	for t in ts:
 		t.uninflated_cost = t.cost
@@ -97,7 +354,7 @@ def spinlock_ilp_test(taskset_in, oh, conf, oh_scale=1):
 		    	print "[fp_test] Response times not monotonic! PID=%d" % os.getpid()
 		    	assert(False)
 		    t.response_old = t.response_time
-		bounds.apply_pfp_lp_msrp_bounds(ts)
+		cached_bounds(bounds.apply_pfp_lp_msrp_bounds, ts)
 #                dbg_human_print(ts, int(conf.num_cpus))
 		if not fp_schedulable_without_qui(ts):
 			return (0, mem, None)
@@ -106,8 +363,9 @@ def spinlock_ilp_test(taskset_in, oh, conf, oh_scale=1):
 	
 def pfrwlock_test(taskset_in, oh, conf, oh_scale=1):
 	mem = 0
-	ts = copy.deepcopy(taskset_in)
+	ts = analysis_view(taskset_in)
 	charge_pfrwlock_overheads(oh, ts, conf, oh_scale)
+	if prefilter(pfrwlock_test, ts, REJECT_FILTERS) == 0: return (0, mem, None)
 	for t in ts:
 		t.response_old = 0
 		t.uninflated_cost = t.cost
@@ -122,7 +380,7 @@ def pfrwlock_test(taskset_in, oh, conf, oh_scale=1):
 		    t.response_old = t.response_time
 		bounds.apply_phase_fair_rw_bounds(ts, 1, pi_aware=True)
 		for t in ts:
-		    if 'prio_inversion' in t.__dict__ and 'mc_type' in t.__dict__:
+		    if 'prio_inversion' in t.__dict__ and hasattr(t, 'mc_type'):
 		        t.prio_inversion = 0
 		if not fp_schedulable_without_qui(ts):
 			return (0, mem, None)
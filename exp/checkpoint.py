@@ -0,0 +1,118 @@
+# Checkpoints of long experiment runs.
+#
+# While a configuration runs, its progress (completed sweep points, the
+# samples of the current point, the random state and the counters) is kept
+# in <output_file>.ckpt. The file is rewritten atomically after a sample
+# chunk or sweep point, at most every 'checkpoint_interval' seconds (default
+# CHECKPOINT_INTERVAL), and removed when the run completes. If the run is
+# killed, a restart ('python -m exp' without -f) resumes from the last saved
+# chunk and writes the same table as an uninterrupted run.
+
+import os
+import cPickle as pickle
+import hashlib
+import random
+import time
+
+import numpy
+
+import counters
+
+SUFFIX = '.ckpt'
+CHECKPOINT_INTERVAL = 30
+
+# Keys that affect how a run is executed, but not its results.
+EXECUTION_KEYS = ('output', 'output_file', 'checkpoint', 'checkpoint_interval',
+                  'sample_workers', 'sample_chunk', 'point_workers',
+                  'mc_workers', 'statistics')
+
+def checkpoint_file(output_file):
+    return output_file + SUFFIX
+
+def checkpoint_exists(output_file):
+    return os.path.exists(checkpoint_file(output_file))
+
+def discard_checkpoint(output_file):
+    if checkpoint_exists(output_file):
+        os.remove(checkpoint_file(output_file))
+
+def random_state():
+    return (random.getstate(), numpy.random.get_state())
+
+def set_random_state(state):
+    random.setstate(state[0])
+    numpy.random.set_state(state[1])
+
+def run_fingerprint(confs, tests):
+    """Identity of a run: its sweep points and tests. A checkpoint of a
+    different run (e.g., after the config file changed) is ignored; a
+    change of the EXECUTION_KEYS (e.g., the number of workers) is not."""
+    points = [sorted((k, str(v)) for (k, v) in conf.items()
+                     if k not in EXECUTION_KEYS and not callable(v))
+              for conf in confs]
+    names = [t.__name__ for t in tests]
+    return hashlib.sha1(repr((points, names))).hexdigest()
+
+class Checkpoint(object):
+    """Progress of a run, stored in fname (None: not stored) at most every
+    interval seconds."""
+
+    def __init__(self, fname, fingerprint, interval=CHECKPOINT_INTERVAL):
+        self.fname = fname
+        self.interval = interval
+        self.written = None
+        self.state = {}
+        if fname and os.path.exists(fname):
+            with open(fname, 'rb') as f:
+                state = pickle.load(f)
+            if state.get('fingerprint') == fingerprint:
+                self.state = state
+                # the counters of the work done so far
+                counters.reset()
+                counters.merge(state.get('counters', {}))
+        self.state['fingerprint'] = fingerprint
+
+    def get(self, key, default=None):
+        return self.state.get(key, default)
+
+    def put(self, key, value):
+        self.state[key] = value
+        if not self.fname:
+            return
+        if self.written is not None and time.time() - self.written < self.interval:
+            return
+        self.write()
+
+    def write(self):
+        self.state['counters'] = counters.snapshot()
+        tmp = self.fname + '.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump(self.state, f, pickle.HIGHEST_PROTOCOL)
+        os.rename(tmp, self.fname)
+        self.written = time.time()
+
+    def discard(self, key):
+        """ Forget key (on disk with the next put()). """
+        self.state.pop(key, None)
+
+    def start_random_state(self, key):
+        """Restore the random state saved under key, or save the current one."""
+        state = self.get(key)
+        if state is not None:
+            set_random_state(state)
+        else:
+            self.put(key, random_state())
+
+    def remove(self):
+        if self.fname and os.path.exists(self.fname):
+            os.remove(self.fname)
+
+def run_checkpoint(confs, tests):
+    """The checkpoint of the run of tests over confs, stored next to the
+    output file unless the 'checkpoint' key is 0."""
+    conf = confs[0] if confs else {}
+    fname = None
+    if 'output_file' in conf and int(conf.get('checkpoint', 1)):
+        fname = checkpoint_file(conf['output_file'])
+    interval = float(conf.get('checkpoint_interval', CHECKPOINT_INTERVAL))
+    return Checkpoint(fname, run_fingerprint(confs, tests), interval)
@@ -0,0 +1,117 @@
+# On-disk corpora of generated tasksets.
+#
+# A corpus holds the tasksets of one generator key (see corpus_key(): cores,
+# tasks per core, utilization, periods and a seed) in a directory given by
+# the 'corpus' key, so that sweep points, sibling configurations that only
+# differ in analysis parameters (read_len, num_mem, ...) and reruns all use
+# the same tasksets, generated once. Only the tasks themselves are stored;
+# the resource requests are drawn per run.
+#
+# Tasksets are generated in blocks of BLOCK samples, each from a seed derived
+# from the key and the block, so a corpus does not depend on how often it was
+# extended. Every block is a .npy matrix of its own (in the directory of the
+# corpus, see corpus_dir()) with one row per column (cost, period, partition)
+# and one column per task; taskset j of the block consists of the tasks
+# j * T ... (j + 1) * T - 1, where T is the number of tasks per taskset. An
+# extension only writes the new blocks, each to a private file that is
+# renamed into place. The blocks are memory-mapped read-only and read a
+# taskset at a time.
+
+import os
+import hashlib
+
+import numpy
+from numpy.lib.format import open_memmap
+
+BLOCK = 100
+COLUMNS = ('cost', 'period', 'partition')
+DTYPE = numpy.int32
+
+def corpus_key(conf):
+    return (int(conf.num_cpus), int(conf.num_task), float(conf.util),
+            conf.periods, conf.get('period_dist', 'unif'),
+            int(conf.get('corpus_seed', 0)))
+
+def corpus_dir(directory, key):
+    return os.path.join(directory, 'corpus-%s' %
+                        hashlib.sha1(repr(key)).hexdigest()[:16])
+
+def block_seed(key, block):
+    return int(hashlib.sha1(repr((key, block))).hexdigest()[:8], 16)
+
+class Corpus(object):
+    """The tasksets of key, stored in directory. generate(rows, rng) returns
+    the (cost, period, partition) matrices of rows new tasksets drawn from
+    the numpy RandomState rng, one taskset per row."""
+
+    def __init__(self, directory, key, generate):
+        self.key = key
+        self.generate = generate
+        self.tasks = key[0] * key[1]
+        self.dir = corpus_dir(directory, key)
+        self.blocks = {}
+        self.size = 0
+        if not os.path.isdir(self.dir):
+            try:
+                os.makedirs(self.dir)
+            except OSError:
+                # created concurrently
+                pass
+        self.load()
+
+    def __len__(self):
+        return self.size
+
+    def block_file(self, block):
+        return os.path.join(self.dir, 'block-%06d.npy' % block)
+
+    def load(self):
+        """ Count the blocks stored so far (by any process). """
+        while os.path.exists(self.block_file(self.size // BLOCK)):
+            self.size += BLOCK
+
+    def extend(self, n):
+        """ Make sure the corpus holds at least n tasksets. """
+        if n <= self.size:
+            return
+        # maybe another process extended it already
+        self.load()
+        for block in xrange(self.size // BLOCK, (n + BLOCK - 1) // BLOCK):
+            fname = self.block_file(block)
+            if not os.path.exists(fname):
+                self.write_block(block, fname)
+            self.size += BLOCK
+
+    def write_block(self, block, fname):
+        rng = numpy.random.RandomState(block_seed(self.key, block))
+        columns = self.generate(BLOCK, rng)
+        tmp = '%s.%d.tmp' % (fname, os.getpid())
+        out = open_memmap(tmp, mode='w+', dtype=DTYPE,
+                          shape=(len(COLUMNS), BLOCK * self.tasks))
+        for (i, col) in enumerate(columns):
+            out[i] = col.ravel()
+        out.flush()
+        del out
+        os.rename(tmp, fname)
+
+    def block(self, block):
+        if block not in self.blocks:
+            self.blocks[block] = numpy.load(self.block_file(block), mmap_mode='r')
+        return self.blocks[block]
+
+    def rows(self, first, count):
+        """Lazily yield the (cost, period, partition) arrays of the tasksets
+        first ... first + count - 1."""
+        self.extend(first + count)
+        for i in xrange(first, first + count):
+            (block, j) = divmod(i, BLOCK)
+            task = self.block(block)[:, j * self.tasks:(j + 1) * self.tasks]
+            yield (task[0], task[1], task[2])
+
+# Open corpora of this process, by directory and key.
+CORPORA = {}
+
+def open_corpus(directory, key, generate):
+    if (directory, key) not in CORPORA:
+        CORPORA[(directory, key)] = Corpus(directory, key, generate)
+    return CORPORA[(directory, key)]
@@ -0,0 +1,55 @@
+# Per-run counters of the analysis machinery (searches, caches, filters, ...).
+#
+# Counters are plain integers keyed by a dotted name such as
+# 'qui-search.analyses'. They live in the process that runs a configuration:
+# run_config() resets them before the experiment driver starts and appends
+# them to the output after the data. Counting is enabled by the 'statistics'
+# key; without it nothing is recorded and no STATISTICS section is written.
+# For every pair 'x.hits'/'x.misses' the output also reports the derived
+# 'x.hit-rate'.
+
+from toolbox.io import header, dotted
+
+COUNTERS = {}
+ENABLED = True
+
+def enable(on=True):
+    global ENABLED
+    ENABLED = on
+
+def count(key, n=1):
+    if ENABLED:
+        COUNTERS[key] = COUNTERS.get(key, 0) + n
+
+def get(key):
+    return COUNTERS.get(key, 0)
+
+def reset():
+    COUNTERS.clear()
+
+def snapshot():
+    return dict(COUNTERS)
+
+def merge(other):
+    """Add the counters of another process (see snapshot())."""
+    for key in other:
+        count(key, other[key])
+
+def hit_rates():
+    rates = {}
+    for key in COUNTERS:
+        if key.endswith('.hits'):
+            group = key[:-len('.hits')]
+            total = COUNTERS[key] + get(group + '.misses')
+            if total:
+                rates[group + '.hit-rate'] = '%.3f' % (COUNTERS[key] / float(total))
+    return rates
+
+def write_counters(f, width=30):
+    if not COUNTERS:
+        return
+    f.write('%s\n' % header('STATISTICS'))
+    values = dict(COUNTERS)
+    values.update(hit_rates())
+    for key in sorted(values):
+        f.write('# %s: %s\n' % (dotted(key, width), values[key]))
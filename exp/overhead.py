@@ -1,7 +1,51 @@
+import os
 from math import ceil
+
+import numpy
+
 from schedcat.util.csv import load_columns as load_column_csv
 from schedcat.util.math import const
 
+class OverheadModel(object):
+    """An overhead as a function of the core count: piecewise linear
+    through the measured points (their running maximum if monotone),
+    constant below the first point and extrapolated with the slope of the
+    last segment beyond the last one.
+
+    The values for 0 ... the largest measured core count are precomputed,
+    so that model[n] (or model(n)) is a list lookup for those core counts;
+    evaluate() takes an array of core counts.
+    """
+    def __init__(self, points, monotone=False):
+        points = sorted(points)
+        self.x = numpy.array([x for (x, _) in points], dtype=float)
+        self.y = numpy.array([y for (_, y) in points], dtype=float)
+        if monotone:
+            self.y = numpy.maximum.accumulate(self.y)
+        self.table = self.evaluate(numpy.arange(int(self.x[-1]) + 1)).tolist()
+
+    def evaluate(self, cores):
+        cores = numpy.asarray(cores, dtype=float)
+        y = numpy.interp(cores, self.x, self.y)
+        if len(self.x) > 1:
+            slope = (self.y[-1] - self.y[-2]) / (self.x[-1] - self.x[-2])
+            y = numpy.where(cores > self.x[-1],
+                            self.y[-1] + slope * (cores - self.x[-1]), y)
+        return y
+
+    def __getitem__(self, cores):
+        if 0 <= cores < len(self.table) and cores == int(cores):
+            return self.table[int(cores)]
+        return float(self.evaluate(cores))
+
+    __call__ = __getitem__
+
+    def __str__(self):
+        return 'OverheadModel(%s)' % zip(self.x.tolist(), self.y.tolist())
+
+# Overheads parsed by this process, by file, modification time and options.
+OVERHEADS_CACHE = {}
+
 class Overheads(object):
     """Legacy overhead objects"""
     def __init__(self):
@@ -45,7 +89,7 @@ class Overheads(object):
         return " ".join(["%s: %s" % (name, self.__dict__[field])
                          for (name, field) in Overheads.FIELD_MAPPING])
 
-    def load_approximations(self, fname, non_decreasing=True, custom_fields=None,
+    def load_approximations(self, fname, non_decreasing=False, custom_fields=None,
                             per_cpu_task_counts=False, num_cpus=None):
         if custom_fields is None:
             custom_fields = []
@@ -61,22 +105,23 @@ class Overheads(object):
         for (name, field) in Overheads.FIELD_MAPPING + custom_fields:
             if name in data.by_name:
                 points = zip(data.by_name['CORE-COUNT'], data.by_name[name])
-                d = {key: value for (key, value) in points}
-                self.__dict__[field] = d
-                # if per_cpu_task_counts:
-                #     points = [(num_cpus * x, y) for (x, y) in points]
-                # if non_decreasing:
-                #     self.__dict__[field] = monotonic_pwlin(points)
-                # else:
-                #     self.__dict__[field] = piece_wise_linear(points)
-                # print name, field, self.__dict__[field], points
+                if per_cpu_task_counts:
+                    points = [(num_cpus * x, y) for (x, y) in points]
+                self.__dict__[field] = OverheadModel(points, non_decreasing)
 
     @staticmethod
     def from_file(fname, *args, **kargs):
-        o = Overheads()
-        o.source = fname
-        o.load_approximations(fname, *args, **kargs)
-        return o
+        """The overheads in fname, parsed once per process (and again only
+        if the file changes). The returned object is shared; do not modify
+        it."""
+        key = repr((os.path.abspath(fname), os.path.getmtime(fname), args,
+                    sorted(kargs.items())))
+        if not key in OVERHEADS_CACHE:
+            o = Overheads()
+            o.source = fname
+            o.load_approximations(fname, *args, **kargs)
+            OVERHEADS_CACHE[key] = o
+        return OVERHEADS_CACHE[key]
 
 def charge_overhead(tasks, rcost, wcost):
     for t in tasks:
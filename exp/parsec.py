@@ -2,14 +2,24 @@ from __future__ import division
 import copy
 import random
 
+import numpy as np
+
 from schedcat.model.tasks import SporadicTask, TaskSystem
 import schedcat.locking.bounds as bounds
 import schedcat.sched.fp as fp
 
 from overhead import *
 from analysis import *
+import counters
+
+# The RTA sums the higher-priority interference of a task with NumPy once
+# the task has at least RTA_NUMPY_MIN_TASKS higher-priority tasks, and with a
+# plain loop below that, where the per-call overhead of NumPy dominates
+# (about 6 us per sum, against 1.5 us for 2 tasks and 10 us for 16 tasks with
+# the loop; 64 tasks take 33 us with the loop).
+RTA_NUMPY_MIN_TASKS = 16
 
-def init_smr_taskset(ts):
+def init_smr_taskset(ts, seed=None):
     for t in ts:
         t.blocked = 0
         t.uninflated_cost = t.cost
@@ -18,6 +28,65 @@ def init_smr_taskset(ts):
         t.q_blocked = 0
         t.read_response_time = task_max_read_cost(t)
         t.read_response_old = 0
+    # the request model may have changed since the last analysis
+    ts.writer_index = WriterIndex(ts)
+    if seed is not None:
+        seed_smr_taskset(ts, seed)
+
+def smr_response_times(ts):
+    """ Snapshot the response times of a converged SMR analysis. """
+    return [(t.response_time, t.read_response_time) for t in ts]
+
+def seed_smr_taskset(ts, seed):
+    """Warm-start the SMR fixed point from the snapshot seed.
+
+    A snapshot taken at a neighbouring quiescence period is usually a lower
+    bound of the fixed point, in which case the iteration converges to the
+    same fixed point as a cold start, in far fewer rounds.  It is not always
+    one: the reclamation term grows with the period while the quiescence
+    term shrinks.  A seeded analysis therefore raises SeedRejected when a
+    bound would decrease, and warm_started() falls back to a cold start.
+    """
+    for t, (r, rr) in zip(ts, seed):
+        t.response_time = max(t.response_time, r)
+        t.read_response_time = max(t.read_response_time, rr)
+    writer_index(ts).refresh()
+
+class SeedRejected(Exception):
+    pass
+
+def warm_started(analysis, ts, q, seed):
+    """Run the SMR analysis from seed, falling back to a cold start if the
+    seed is rejected or the seeded run fails (a too-high seed can push a
+    bound past its deadline), so the verdict equals the cold-start one.
+
+    Returns (verdict, seeded); seeded tells whether ts holds the response
+    times of the seeded run. These can lie above the least fixed point, so
+    the memory bound must not be taken from them (see cold_restart())."""
+    if seed is not None:
+        try:
+            r = analysis(ts, q, seed)
+            if r: return (r, True)
+        except SeedRejected:
+            pass
+    return (analysis(ts, q), False)
+
+def cold_restart(analysis, ts, q, snapshot, seeded):
+    """Put the response times of the selected period q.period into ts: the
+    snapshot of a cold run is restored, a seeded one is recomputed cold."""
+    if seeded:
+        counters.count('qui-search.cold-restarts')
+        r = analysis(ts, q)
+        # the least fixed point lies below the seeded one
+        assert r
+    else:
+        restore_smr_response_times(ts, snapshot)
+
+def restore_smr_response_times(ts, snapshot):
+    for t, (r, rr) in zip(ts, snapshot):
+        t.response_time = r
+        t.read_response_time = rr
+    writer_index(ts).refresh()
 
 def task_max_read_cost(t):
     r = 0
@@ -27,26 +96,75 @@ def task_max_read_cost(t):
             r = req.max_read_length
     return r
 
+def is_writer(t):
+    req = t.resmodel[0]
+    return req.max_writes > 0 and req.max_write_length > 0
+
 def get_highest_writer(ts):
     for i in xrange(len(ts)):
-        req = ts[i].resmodel[0]
-        if  req.max_writes > 0 and req.max_write_length > 0:
+        if is_writer(ts[i]):
             return ts[i]
     return None
 
+class WriterIndex(object):
+    """The writers of a task set, with their periods and response times as
+    arrays, and the highest-priority writer of every partition.
+
+    The response-time array is a copy: it is refreshed from the tasks at the
+    start of every RTA pass and kept up to date by the RTA kernel whenever it
+    assigns the response time of a writer, which makes the outstanding-memory
+    count a single vectorized expression in the innermost RTA loop.
+    init_smr_taskset() rebuilds the index, since the request model of the
+    task set may change between analyses.
+    """
+    def __init__(self, taskset):
+        self.size = len(taskset)
+        self.writers = [t for t in taskset if is_writer(t)]
+        self.slot = dict((id(w), i) for (i, w) in enumerate(self.writers))
+        self.periods = np.array([w.period for w in self.writers], dtype=float)
+        self.response = np.zeros(len(self.writers))
+        self.highest = {}
+        for w in self.writers:
+            if w.partition not in self.highest:
+                self.highest[w.partition] = w
+        if all([hasattr(w, 'response_time') for w in self.writers]):
+            self.refresh()
+
+    def refresh(self):
+        self.response[:] = [w.response_time for w in self.writers]
+
+    def update(self, task):
+        i = self.slot.get(id(task))
+        if i is not None:
+            self.response[i] = task.response_time
+
+    def highest_writer(self, ts):
+        """ Highest-priority writer of partition ts, or None. """
+        return self.highest.get(ts[0].partition) if ts else None
+
+    def num_mem(self, time, num):
+        if not self.writers:
+            return 0
+        return num*int(np.ceil((time + self.response) / self.periods).sum())
+
+def writer_index(ts):
+    index = ts.__dict__.get('writer_index')
+    if index is None or index.size != len(ts):
+        index = WriterIndex(ts)
+        ts.writer_index = index
+    return index
+
 def get_min_qui_period(taskset):
     r = 0
-    for ts in iter_partitions_ts(taskset):
-        w = get_highest_writer(ts)
-        if w != None and w.period > r:
+    for w in writer_index(taskset).highest.itervalues():
+        if w.period > r:
             r = w.period
     return r
 
 def get_max_quic_response(taskset):
     r = 0
-    for ts in iter_partitions_ts(taskset):
-        w = get_highest_writer(ts)
-        if w != None and w.response_time > r:
+    for w in writer_index(taskset).highest.itervalues():
+        if w.response_time > r:
             r = w.response_time
     return r
 
@@ -56,9 +174,8 @@ def get_max_read_response(ts):
 # L^* is upper-bounded by max writer's response time
 def get_max_L(ts):
     l = 0
-    for t in ts:
-        req = t.resmodel[0]
-        if req.max_writes and req.max_write_length > 0 and t.response_time > l:
+    for t in writer_index(ts).writers:
+        if t.response_time > l:
             l = t.response_time
     return l
 
@@ -75,28 +192,59 @@ def parsec_block(ts):
     return 0
 
 def get_num_mem(ts, time, num):
-    r = 0
-    for t in ts:
-        req = t.resmodel[0]
-        if req.max_writes and req.max_write_length > 0:
-            r += int(ceil((time + t.response_time)/ t.period))
-    return num*r
+    index = writer_index(ts)
+    index.refresh()
+    return index.num_mem(time, num)
 
 def get_smr_max_mem(ts, theta, num):
     time = theta + get_max_quic_response(ts)
     return get_num_mem(ts, time, num)
 
+class PartitionArrays(object):
+    """Costs and periods of one partition, in priority order.
+
+    The costs are snapshotted when the object is built, so it has to be
+    rebuilt whenever the costs of the partition change (i.e., once per
+    fixed-point round). The NumPy arrays are only built for partitions
+    large enough to use them (see RTA_NUMPY_MIN_TASKS).
+    """
+    __slots__ = ('tasks', 'costs', 'periods', 'prefix')
+
+    def __init__(self, ts):
+        self.tasks = [(t.cost, t.period) for t in ts]
+        self.prefix = [0]
+        for (cost, _) in self.tasks:
+            self.prefix.append(self.prefix[-1] + cost)
+        self.costs = self.periods = None
+        if len(self.tasks) > RTA_NUMPY_MIN_TASKS:
+            self.costs = np.array([cost for (cost, _) in self.tasks])
+            self.periods = np.array([period for (_, period) in self.tasks])
+
+    def hp_cost(self, i):
+        """Sum of the costs of the tasks with a priority higher than task i."""
+        return self.prefix[i]
+
+    def interference(self, i, delta):
+        """Demand of the tasks with a priority higher than task i in a window
+        of length delta, i.e. sum_j C_j * ceil(delta / T_j) for j < i."""
+        if i >= RTA_NUMPY_MIN_TASKS and self.costs is not None:
+            jobs = np.ceil(delta / self.periods[:i]).astype(np.int64)
+            return np.dot(self.costs[:i], jobs).item()
+        demand = 0
+        for (cost, period) in self.tasks[:i]:
+            demand += cost * int(ceil(delta / period))
+        return demand
+
 # read section response time analysis
-def rta_read_quiescence_aware(task, own_demand, higher_prio_tasks, qui, theta, ts):
-    # see if we find a point where the demand is satisfied
-    delta = sum([t.cost for t in higher_prio_tasks]) + own_demand
+def rta_read_quiescence_aware(task, own_demand, hp, i, qui, theta, ts):
+    # see if we find a point where the demand is satisfied; the bound from
+    # the previous round (or the warm-start seed) is a valid starting point
+    delta = max(hp.hp_cost(i) + own_demand, task.read_response_time)
     while delta <= task.deadline:
-        demand = own_demand
-        for t in higher_prio_tasks:
-            demand += t.cost * int(ceil(delta / t.period))
+        demand = own_demand + hp.interference(i, delta)
         if task.period > qui.priority:
             demand += qui.arpha_cost * int(ceil(delta / qui.period))
-            mem = get_num_mem(ts, theta+delta, qui.num_mem)
+            mem = writer_index(ts).num_mem(theta+delta, qui.num_mem)
             demand += mem*qui.beta_cost
             demand = int(ceil(demand))
         if demand == delta:
@@ -110,20 +258,23 @@ def rta_read_quiescence_aware(task, own_demand, higher_prio_tasks, qui, theta, t
     task.read_response_time = delta
     return False
 
-def rta_read_calc(task, higher_prio_tasks, qui, theta, taskset):
+def rta_read_calc(task, hp, i, qui, theta, taskset):
     own_demand = task_max_read_cost(task)
     if own_demand == 0: return True
-    return rta_read_quiescence_aware(task, own_demand, higher_prio_tasks, qui, theta, taskset)
+    return rta_read_quiescence_aware(task, own_demand, hp, i, qui, theta, taskset)
 
 def read_is_schedulable_with_qui(ts, qui, theta, taskset):
+    hp = PartitionArrays(ts)
+    writer_index(taskset).refresh()
     for i, t in enumerate(ts):
-        if not rta_read_calc(t, ts[0:i], qui, theta, taskset):
+        if not rta_read_calc(t, hp, i, qui, theta, taskset):
             return False
     return True
 
 def fp_read_schedulable_with_qui(taskset, q, theta):
+    writers = writer_index(taskset)
     for ts in iter_partitions_ts(taskset):
-        w = get_highest_writer(ts)
+        w = writers.highest_writer(ts)
         if w != None:
             q.priority = w.period
         else:
@@ -133,46 +284,50 @@ def fp_read_schedulable_with_qui(taskset, q, theta):
     return True
 
 # response time analysis
-def rta_quiescence_aware(task, own_demand, higher_prio_tasks, qui, theta, ts):
-    # see if we find a point where the demand is satisfied
-    delta = sum([t.cost for t in higher_prio_tasks]) + own_demand
+def rta_quiescence_aware(task, own_demand, hp, i, qui, theta, ts):
+    # see if we find a point where the demand is satisfied; the bound from
+    # the previous round (or the warm-start seed) is a valid starting point
+    delta = max(hp.hp_cost(i) + own_demand, task.response_time)
     while delta <= task.deadline:
-        demand = own_demand
-        for t in higher_prio_tasks:
-            demand += t.cost * int(ceil(delta / t.period))
+        demand = own_demand + hp.interference(i, delta)
         if task.period >= qui.priority:
             demand += qui.arpha_cost * int(ceil(delta / qui.period))
-            mem = get_num_mem(ts, theta+delta, qui.num_mem)
+            mem = writer_index(ts).num_mem(theta+delta, qui.num_mem)
             demand += mem*qui.beta_cost
             demand = int(ceil(demand))
         if demand == delta:
             # yep, demand will be met by time
             task.response_time = delta
+            writer_index(ts).update(task)
             return True
         else:
             # try again
             delta = demand
     # if we get here, we didn't converge
     task.response_time = delta
+    writer_index(ts).update(task)
     return False
 
-def rta_calc(task, higher_prio_tasks, qui, theta, taskset):
-    if 'mc_type' in task.__dict__:
+def rta_calc(task, hp, i, qui, theta, taskset):
+    if hasattr(task, 'mc_type'):
         if task.mc_type == "reader": task.blocked = 0
     own_demand = task.cost + task.blocked + task.q_blocked
-    r = rta_quiescence_aware(task, own_demand, higher_prio_tasks, qui, theta, taskset)
+    r = rta_quiescence_aware(task, own_demand, hp, i, qui, theta, taskset)
 
     return r
 
 def is_schedulable_with_qui(ts, qui, theta, taskset):
+    hp = PartitionArrays(ts)
+    writer_index(taskset).refresh()
     for i, t in enumerate(ts):
-        if not rta_calc(t, ts[0:i], qui, theta, taskset):
+        if not rta_calc(t, hp, i, qui, theta, taskset):
             return False
     return True
 
 def fp_schedulable_with_qui(taskset, q, theta, q_block):
+    writers = writer_index(taskset)
     for ts in iter_partitions_ts(taskset):
-        w = get_highest_writer(ts)
+        w = writers.highest_writer(ts)
         if w != None:
             q.priority = w.period
             w.q_blocked = q_block
@@ -182,187 +337,314 @@ def fp_schedulable_with_qui(taskset, q, theta, q_block):
             return False
     return True
 
-def smr_is_schedulable(ts, q, get_theta, get_block):
-    init_smr_taskset(ts)
-    stop = False
-
-    while not stop:
-        old_theta = get_theta(ts, q)
-        old_block = get_block(ts)
-        while True:
-            for t in ts:
-                t.cost = t.uninflated_cost
-                if t.response_time < t.response_old:
-                    print "[fp_test] Response times not monotonic! PID=%d" % os.getpid()
-                    assert(False)
-                t.response_old = t.response_time
-            theta = get_theta(ts, q)
-            block = get_block(ts)
-            bounds.apply_pfp_lp_smr_msrp_bounds(ts)
-#            dbg_human_print(ts, 40)
-            if not fp_schedulable_with_qui(ts, q, theta, block):
-                return 0
-            if response_times_consistent(ts):
+def lp_smr_bounds(ts):
+    cached_bounds(bounds.apply_pfp_lp_smr_msrp_bounds, ts)
+
+def task_fair_smr_bounds(ts):
+    bounds.apply_smr_task_fair_mutex_bounds(ts, 1, pi_aware=True)
+
+class QuiescenceScope(object):
+    """Where the quiescence of an SMR protocol is accounted for: the
+    (read) schedulability test, the shortest quiescence period with its
+    core, and the memory bound."""
+    def __init__(self, schedulable, read_schedulable, min_period, max_mem):
+        self.schedulable = schedulable
+        self.read_schedulable = read_schedulable
+        self.min_period = min_period
+        self.max_mem = max_mem
+
+# quiescence on every partition (PARSEC)
+GLOBAL_QUIESCENCE = QuiescenceScope(
+    fp_schedulable_with_qui,
+    fp_read_schedulable_with_qui,
+    lambda ts: (get_min_qui_period(ts), None),
+    lambda ts, theta, qui: get_smr_max_mem(ts, theta, qui.num_mem))
+
+class SMRAnalysis(object):
+    """The SMR schedulability analysis and the quiescence-period selections
+    built on it, parameterized by the theta/block terms of the protocol, the
+    blocking bound and the quiescence scope. Every SMR variant (ILP or not,
+    PARSEC or URCU style) runs on this one implementation.
+    """
+    def __init__(self, get_theta, get_block, apply_bounds=lp_smr_bounds,
+                 scope=GLOBAL_QUIESCENCE):
+        self.get_theta = get_theta
+        self.get_block = get_block
+        self.apply_bounds = apply_bounds
+        self.scope = scope
+
+    def is_schedulable(self, ts, q, seed=None):
+        get_theta = self.get_theta
+        get_block = self.get_block
+        init_smr_taskset(ts, seed)
+        stop = False
+
+        while not stop:
+            old_theta = get_theta(ts, q)
+            old_block = get_block(ts)
+            while True:
+                for t in ts:
+                    t.cost = t.uninflated_cost
+                    if t.response_time < t.response_old:
+                        if seed is not None: raise SeedRejected()
+                        print "[fp_test] Response times not monotonic! PID=%d" % os.getpid()
+                        assert(False)
+                    t.response_old = t.response_time
+                theta = get_theta(ts, q)
+                block = get_block(ts)
+                self.apply_bounds(ts)
+#                dbg_human_print(ts, 40)
+                if not self.scope.schedulable(ts, q, theta, block):
+                    return 0
+                if response_times_consistent(ts):
+                    break
+
+            while True:
+                for t in ts:
+                    if t.read_response_time < t.read_response_old:
+                        if seed is not None: raise SeedRejected()
+                        print "[fp_test] Read response times not monotonic! PID=%d" % os.getpid()
+                        assert(False)
+                    t.read_response_old = t.read_response_time
+                theta = get_theta(ts, q)
+                block = get_block(ts)
+                if not self.scope.read_schedulable(ts, q, theta):
+                    return 0
+                if read_response_times_consistent(ts):
+                    break
+
+            stop = response_times_consistent(ts)
+            stop = stop and read_response_times_consistent(ts)
+            assert stop == True
+            if old_theta != get_theta(ts, q) or old_block != get_block(ts):
+                stop = False
+        return 1
+
+    def max_mem(self, ts, qui):
+        return self.scope.max_mem(ts, self.get_theta(ts, qui), qui)
+
+    def binary_selection(self, ts, qui, max_q, min_q, seed=None):
+        # every probe lies below the shortest schedulable period found so far,
+        # whose response times therefore seed the probe (see seed_smr_taskset())
+        best = seed
+        warm = False
+        while min_q < max_q:
+            qp = int((min_q + max_q)/2)
+            qui.period = qp
+            (r, seeded) = warm_started(self.is_schedulable, ts, qui, best)
+            if r:
+                max_q = qp
+                best = smr_response_times(ts)
+                warm = seeded
+            else: min_q = qp + 1
+        if best is not None:
+            # report the memory bound of the selected period, not the state
+            # left behind by the last (possibly failed) probe
+            qui.period = max_q
+            cold_restart(self.is_schedulable, ts, qui, best, warm)
+        return (1, self.max_mem(ts, qui), max_q)
+
+    def linear_selection(self, ts, qui, max_q, min_q, search='linear'):
+        if search == 'gallop':
+            (r, m, qp, done, linear) = galloping_quiescence_selection(
+                ts, qui, max_q, min_q, self.is_schedulable, self.max_mem)
+            counters.count('qui-search.analyses', done)
+            counters.count('qui-search.analyses-saved', max(0, linear - done))
+            return (r, m, qp)
+        elif search != 'linear':
+            raise ValueError, "unknown quiescence search '%s'" % search
+
+        qp = min_q
+        r = 0
+        while qp <= max_q:
+            qui.period = qp
+            r = self.is_schedulable(ts, qui)
+            counters.count('qui-search.analyses')
+            if r: break
+            else: qp += min_q
+
+        if r: m = self.max_mem(ts, qui)
+        else: m = 0
+
+        return (r, m, qp)
+
+QUIESCENCE_SEARCHES = ('linear', 'gallop')
+
+# Multiples skipped by the galloping search that its self-check probes.
+GALLOP_CHECKS = 3
+
+def galloping_quiescence_selection(ts, qui, max_q, min_q, analysis, get_mem,
+                                   checks=GALLOP_CHECKS):
+    """Find the shortest schedulable multiple of min_q (up to max_q), i.e. the
+    result of the linear scan, with an exponential search for a schedulable
+    multiple followed by a binary search below it.
+
+    Both searches assume that schedulability is monotone in the quiescence
+    period.  A self-check tests the assumption on up to checks of the
+    multiples below the result that the searches skipped (the largest one
+    and evenly strided others): if one of them is schedulable, the linear
+    scan is run instead (counted as 'qui-search.fallbacks').
+
+    Returns (r, m, qp, analyses, linear_analyses): the analyses performed and
+    the analyses the linear scan needs for the same answer.
+    """
+    n = int(max_q // min_q)
+    verdicts = {}
+    snapshots = {}
+    seeded = set()
+
+    def probe(k):
+        if k not in verdicts:
+            above = [j for j in snapshots if j > k]
+            seed = snapshots[min(above)] if above else None
+            qui.period = k * min_q
+            (verdicts[k], warm) = warm_started(analysis, ts, qui, seed)
+            if verdicts[k]:
+                snapshots[k] = smr_response_times(ts)
+                if warm:
+                    seeded.add(k)
+        return verdicts[k]
+
+    # exponential phase: lo is unschedulable (0 = none), hi is schedulable
+    lo, hi, k = 0, None, 1
+    while k <= n:
+        if probe(k):
+            hi = k
+            break
+        lo = k
+        k = n if k < n and 2*k > n else 2*k
+    # binary phase
+    if hi is not None:
+        while hi - lo > 1:
+            mid = (lo + hi)//2
+            if probe(mid): hi = mid
+            else: lo = mid
+    # self-check
+    skipped = [j for j in xrange(1, hi if hi is not None else n + 1)
+               if j not in verdicts]
+    if len(skipped) > checks:
+        stride = len(skipped) // checks
+        skipped = sorted(set(skipped[-1:] + skipped[stride - 1::stride][:checks - 1]))
+    if [j for j in skipped if probe(j)]:
+        counters.count('qui-search.fallbacks')
+        hi = None
+        for j in xrange(1, n + 1):
+            if probe(j):
+                hi = j
                 break
 
-        while True:
-            for t in ts:
-                if t.read_response_time < t.read_response_old:
-                    print "[fp_test] Read response times not monotonic! PID=%d" % os.getpid()
-                    assert(False)                    
-                t.read_response_old = t.read_response_time
-            theta = get_theta(ts, q)
-            block = get_block(ts)
-            if not fp_read_schedulable_with_qui(ts, q, theta):
-                return 0
-            if read_response_times_consistent(ts):
-                break
-
-        stop = response_times_consistent(ts)
-        stop = stop and read_response_times_consistent(ts)
-        assert stop == True
-        if old_theta != get_theta(ts, q) or old_block != get_block(ts):
-            stop = False
-    return 1
-
-def quiescence_selection_test(ts, qui, max_q, min_q, get_theta, get_block):
-    while min_q < max_q:
-        qp = int((min_q + max_q)/2)
-        qui.period = qp
-        r = smr_is_schedulable(ts, qui, get_theta, get_block)
-        if r: max_q = qp
-        else: min_q = qp + 1
-    r = 1
-    if r: m = get_smr_max_mem(ts, get_theta(ts, qui), qui.num_mem)
-    else: m = 0
-
-    return (r, m, max_q)
-
-def rt_parsec_test(taskset_in, oh, conf):
+    if hi is None:
+        return (0, 0, (n + 1) * min_q, len(verdicts), n)
+    qui.period = hi * min_q
+    cold_restart(analysis, ts, qui, snapshots[hi], hi in seeded)
+    return (verdicts[hi], get_mem(ts, qui), qui.period, len(verdicts), hi)
+
+def quiescence_search(conf):
+    """ Search mode of the linear quiescence selection ('qui_search' key). """
+    return conf.get('qui_search', 'linear')
+
+class SMRProtocol(object):
+    """An SMR protocol as configured by a test: its overhead charging, the
+    Overheads field of its quiescence cost, its theta/block terms and its
+    quiescence scope."""
+    def __init__(self, charge, q_cost, get_theta, get_block, scope=GLOBAL_QUIESCENCE):
+        self.charge = charge
+        self.q_cost = q_cost
+        self.get_theta = get_theta
+        self.get_block = get_block
+        self.scope = scope
+
+    def analysis(self, apply_bounds=lp_smr_bounds):
+        return SMRAnalysis(self.get_theta, self.get_block, apply_bounds, self.scope)
+
+PARSEC = SMRProtocol(charge_parsec_overheads, 'parsec_q', parsec_theta, parsec_block)
+TIMED_PARSEC = SMRProtocol(charge_time_overheads, 'time_q', parsec_theta, parsec_block)
+
+# quiescence-period selections of smr_test()
+SMR_SELECTIONS = ('binary', 'linear', 'fixed')
+
+def smr_test(test, taskset_in, oh, conf, protocol, selection, apply_bounds=lp_smr_bounds):
+    """Driver of the SMR tests: charge the overheads of protocol and select
+    the quiescence period by a binary search over [min_q, max_q], the linear
+    scan of the multiples of min_q or the fixed conf.qui."""
     mem = 0
-    ts = copy.deepcopy(taskset_in)
-    charge_parsec_overheads(oh, ts, conf)
+    ts = analysis_view(taskset_in)
+    protocol.charge(oh, ts, conf)
+    if prefilter(test, ts, REJECT_FILTERS) == 0: return (0, mem)
     ncores = int(conf.num_cpus)
-    q_arpha_c = oh.parsec_q[ncores]
+    q_arpha_c = getattr(oh, protocol.q_cost)[ncores]
     q_beta_c = oh.mem_free[ncores]
     q_mem = int(conf.num_mem)
-    max_q = ts.max_period()
-    min_q = get_min_qui_period(ts)
     q = Quiescence(q_arpha_c, q_beta_c, q_mem)
-    q.period = max_q
-    if min_q == 0:
-        init_smr_taskset(ts)
-        if fp_schedulable_with_qui(ts, q, 0, 0): return (1, mem)
-        else: return (0, mem)
-    if not smr_is_schedulable(ts, q, parsec_theta, parsec_block):
-        return (0, mem)
-    (r, m, qp) = quiescence_selection_test(ts, q, max_q, min_q, parsec_theta, parsec_block)
-    return (r, m)
+    analysis = protocol.analysis(apply_bounds)
+    (min_q, q.core) = analysis.scope.min_period(ts)
+    if selection == 'fixed':
+        q.period = int(conf.qui)
+        r = analysis.is_schedulable(ts, q)
+        if r: mem = analysis.max_mem(ts, q)
+        return (r, mem)
+    elif selection not in SMR_SELECTIONS:
+        raise ValueError, "unknown quiescence selection '%s'" % selection
 
-def timed_parsec_test(taskset_in, oh, conf):
-    mem = 0
-    ts = copy.deepcopy(taskset_in)
-    charge_time_overheads(oh, ts, conf)
-    ncores = int(conf.num_cpus)
-    q_arpha_c = oh.time_q[ncores]
-    q_beta_c = oh.mem_free[ncores]
-    q_mem = int(conf.num_mem)
     max_q = ts.max_period()
-    min_q = get_min_qui_period(ts)
-    q = Quiescence(q_arpha_c, q_beta_c, q_mem)
     q.period = max_q
     if min_q == 0:
         init_smr_taskset(ts)
-        if fp_schedulable_with_qui(ts, q, 0, 0): return (1, mem)
+        if analysis.scope.schedulable(ts, q, 0, 0): return (1, mem)
         else: return (0, mem)
-    if not smr_is_schedulable(ts, q, parsec_theta, parsec_block):
+    if selection == 'linear':
+        (r, m, qp) = analysis.linear_selection(ts, q, max_q, min_q, quiescence_search(conf))
+        return (r, m)
+    if not analysis.is_schedulable(ts, q):
         return (0, mem)
-    (r, m, qp) = quiescence_selection_test(ts, q, max_q, min_q, parsec_theta, parsec_block)
+    seed = smr_response_times(ts)
+    (r, m, qp) = analysis.binary_selection(ts, q, max_q, min_q, seed)
     return (r, m)
 
-def linear_quiescence_selection(ts, qui, max_q, min_q, get_theta, get_block):
-    qp = min_q
-    r = 0
-    while qp <= max_q:
-        qui.period = qp
-        r = smr_is_schedulable(ts, qui, get_theta, get_block)
-        if r: break;
-        else: qp += min_q
+# The entry points of the individual variants.
+
+def smr_is_schedulable(ts, q, get_theta, get_block, seed=None):
+    return SMRAnalysis(get_theta, get_block).is_schedulable(ts, q, seed)
+
+def smr_is_schedulable_wo_ilp(ts, q, get_theta, get_block, seed=None):
+    return SMRAnalysis(get_theta, get_block, task_fair_smr_bounds).is_schedulable(ts, q, seed)
+
+def quiescence_selection_test(ts, qui, max_q, min_q, get_theta, get_block, seed=None):
+    return SMRAnalysis(get_theta, get_block).binary_selection(ts, qui, max_q, min_q, seed)
+
+def quiescence_selection_test_wo_ilp(ts, qui, max_q, min_q, get_theta, get_block, seed=None):
+    return SMRAnalysis(get_theta, get_block, task_fair_smr_bounds).binary_selection(ts, qui, max_q, min_q, seed)
 
-    if r: m = get_smr_max_mem(ts, get_theta(ts, qui), qui.num_mem)
-    else: m = 0
+def linear_quiescence_selection(ts, qui, max_q, min_q, get_theta, get_block, search='linear'):
+    return SMRAnalysis(get_theta, get_block).linear_selection(ts, qui, max_q, min_q, search)
 
-    return (r, m, qp)
+def rt_parsec_test(taskset_in, oh, conf):
+    return smr_test(rt_parsec_test, taskset_in, oh, conf, PARSEC, 'binary')
+
+def timed_parsec_test(taskset_in, oh, conf):
+    return smr_test(timed_parsec_test, taskset_in, oh, conf, TIMED_PARSEC, 'binary')
 
 def rt_parsec_test_linear(taskset_in, oh, conf):
-    mem = 0
-    ts = copy.deepcopy(taskset_in)
-    charge_parsec_overheads(oh, ts, conf)
-    ncores = int(conf.num_cpus)
-    q_arpha_c = oh.parsec_q[ncores]
-    q_beta_c = oh.mem_free[ncores]
-    q_mem = int(conf.num_mem)
-    max_q = ts.max_period()
-    min_q = get_min_qui_period(ts)
-    q = Quiescence(q_arpha_c, q_beta_c, q_mem)
-    q.period = max_q
-    if min_q == 0:
-        init_smr_taskset(ts)
-        if fp_schedulable_with_qui(ts, q, 0, 0): return (1, mem)
-        else: return (0, mem)
-    (r, m, qp) = linear_quiescence_selection(ts, q, max_q, min_q, parsec_theta, parsec_block)
-    return (r, m)
+    return smr_test(rt_parsec_test_linear, taskset_in, oh, conf, PARSEC, 'linear')
 
 def timed_parsec_test_linear(taskset_in, oh, conf):
-    mem = 0
-    ts = copy.deepcopy(taskset_in)
-    charge_time_overheads(oh, ts, conf)
-    ncores = int(conf.num_cpus)
-    q_arpha_c = oh.time_q[ncores]
-    q_beta_c = oh.mem_free[ncores]
-    q_mem = int(conf.num_mem)
-    max_q = ts.max_period()
-    min_q = get_min_qui_period(ts)
-    q = Quiescence(q_arpha_c, q_beta_c, q_mem)
-    q.period = max_q
-    if min_q == 0:
-        init_smr_taskset(ts)
-        if fp_schedulable_with_qui(ts, q, 0, 0): return (1, mem)
-        else: return (0, mem)
-    (r, m, qp) = linear_quiescence_selection(ts, q, max_q, min_q, parsec_theta, parsec_block)
-    return (r, m)
+    return smr_test(timed_parsec_test_linear, taskset_in, oh, conf, TIMED_PARSEC, 'linear')
 
 def rt_parsec_taskset_qui_test(taskset_in, oh, conf):
-    mem = 0
-    ts = copy.deepcopy(taskset_in)
-    charge_parsec_overheads(oh, ts, conf)
-    ncores    = int(conf.num_cpus)
-    q_arpha_c = oh.parsec_q[ncores]
-    q_beta_c  = oh.mem_free[ncores]
-    q_mem     = int(conf.num_mem)
-    q         = Quiescence(q_arpha_c, q_beta_c, q_mem)
-    q.period  = int(conf.qui)
-    r         = smr_is_schedulable(ts, q, parsec_theta, parsec_block)
-    if r: mem = get_smr_max_mem(ts, parsec_theta(ts, q), q.num_mem)
-    return (r, mem)
+    return smr_test(rt_parsec_taskset_qui_test, taskset_in, oh, conf, PARSEC, 'fixed')
 
 def timed_parsec_taskset_qui_test(taskset_in, oh, conf):
-    mem = 0
-    ts = copy.deepcopy(taskset_in)
-    charge_time_overheads(oh, ts, conf)
-    ncores    = int(conf.num_cpus)
-    q_arpha_c = oh.time_q[ncores]
-    q_beta_c  = oh.mem_free[ncores]
-    q_mem     = int(conf.num_mem)
-    q         = Quiescence(q_arpha_c, q_beta_c, q_mem)
-    q.period  = int(conf.qui)
-    r         = smr_is_schedulable(ts, q, parsec_theta, parsec_block)
-    if r: mem = get_smr_max_mem(ts, parsec_theta(ts, q), q.num_mem)
-    return (r, mem)
+    return smr_test(timed_parsec_taskset_qui_test, taskset_in, oh, conf, TIMED_PARSEC, 'fixed')
+
+def rt_parsec_wo_ilp_test(taskset_in, oh, conf):
+    return smr_test(rt_parsec_wo_ilp_test, taskset_in, oh, conf, PARSEC, 'binary', task_fair_smr_bounds)
+
+def timed_parsec_wo_ilp_test(taskset_in, oh, conf):
+    return smr_test(timed_parsec_wo_ilp_test, taskset_in, oh, conf, TIMED_PARSEC, 'binary', task_fair_smr_bounds)
 
 def mc_parsec_test_linear(taskset_in, oh, conf, oh_scale=1):
     mem = 0
-    ts = copy.deepcopy(taskset_in)
+    ts = analysis_view(taskset_in)
     charge_parsec_overheads_wo_mem(oh, ts, conf, oh_scale)
     ncores = int(conf.num_cpus)
     q_arpha_c = oh.parsec_q[ncores]*oh_scale
@@ -377,103 +659,5 @@ def mc_parsec_test_linear(taskset_in, oh, conf, oh_scale=1):
         init_smr_taskset(ts)
         if fp_schedulable_with_qui(ts, q, 0, 0): return (1, mem, -1, None)
         else: return (0, mem, -1, None)
-    (r, m, qp) = linear_quiescence_selection(ts, q, max_q, min_q, parsec_theta, parsec_block)
+    (r, m, qp) = PARSEC.analysis().linear_selection(ts, q, max_q, min_q, quiescence_search(conf))
     return (r, m, qp, ts)
-
-
-
-
-
-def smr_is_schedulable_wo_ilp(ts, q, get_theta, get_block):
-    init_smr_taskset(ts)
-    stop = False
-
-    while not stop:
-        old_theta = get_theta(ts, q)
-        old_block = get_block(ts)
-        while True:
-            for t in ts:
-                t.cost = t.uninflated_cost
-                if t.response_time < t.response_old:
-                    print "[fp_test] Response times not monotonic! PID=%d" % os.getpid()
-                    assert(False)
-                t.response_old = t.response_time
-            theta = get_theta(ts, q)
-            block = get_block(ts)
-            bounds.apply_smr_task_fair_mutex_bounds(ts, 1, pi_aware=True)
-            if not fp_schedulable_with_qui(ts, q, theta, block):
-                return 0
-            if response_times_consistent(ts):
-                break
-
-        while True:
-            for t in ts:
-                if t.read_response_time < t.read_response_old:
-                    print "[fp_test] Read response times not monotonic! PID=%d" % os.getpid()
-                    assert(False)                    
-                t.read_response_old = t.read_response_time
-            theta = get_theta(ts, q)
-            block = get_block(ts)
-            if not fp_read_schedulable_with_qui(ts, q, theta):
-                return 0
-            if read_response_times_consistent(ts):
-                break
-
-        stop = response_times_consistent(ts)
-        stop = stop and read_response_times_consistent(ts)
-        assert stop == True
-        if old_theta != get_theta(ts, q) or old_block != get_block(ts):
-            stop = False
-    return 1
-
-def quiescence_selection_test_wo_ilp(ts, qui, max_q, min_q, get_theta, get_block):
-    while min_q < max_q:
-        qp = int((min_q + max_q)/2)
-        qui.period = qp
-        r = smr_is_schedulable_wo_ilp(ts, qui, get_theta, get_block)
-        if r: max_q = qp
-        else: min_q = qp + 1
-    m = get_smr_max_mem(ts, get_theta(ts, qui), qui.num_mem)
-    return (1, m, max_q)
-
-def rt_parsec_wo_ilp_test(taskset_in, oh, conf):
-    mem = 0
-    ts = copy.deepcopy(taskset_in)
-    charge_parsec_overheads(oh, ts, conf)
-    ncores = int(conf.num_cpus)
-    q_arpha_c = oh.parsec_q[ncores]
-    q_beta_c = oh.mem_free[ncores]
-    q_mem = int(conf.num_mem)
-    max_q = ts.max_period()
-    min_q = get_min_qui_period(ts)
-    q = Quiescence(q_arpha_c, q_beta_c, q_mem)
-    q.period = max_q
-    if min_q == 0:
-        init_smr_taskset(ts)
-        if fp_schedulable_with_qui(ts, q, 0, 0): return (1, mem)
-        else: return (0, mem)
-    if not smr_is_schedulable_wo_ilp(ts, q, parsec_theta, parsec_block):
-        return (0, mem)
-    (r, m, qp) = quiescence_selection_test_wo_ilp(ts, q, max_q, min_q, parsec_theta, parsec_block)
-    return (r, m)
-
-def timed_parsec_wo_ilp_test(taskset_in, oh, conf):
-    mem = 0
-    ts = copy.deepcopy(taskset_in)
-    charge_time_overheads(oh, ts, conf)
-    ncores = int(conf.num_cpus)
-    q_arpha_c = oh.time_q[ncores]
-    q_beta_c = oh.mem_free[ncores]
-    q_mem = int(conf.num_mem)
-    max_q = ts.max_period()
-    min_q = get_min_qui_period(ts)
-    q = Quiescence(q_arpha_c, q_beta_c, q_mem)
-    q.period = max_q
-    if min_q == 0:
-        init_smr_taskset(ts)
-        if fp_schedulable_with_qui(ts, q, 0, 0): return (1, mem)
-        else: return (0, mem)
-    if not smr_is_schedulable_wo_ilp(ts, q, parsec_theta, parsec_block):
-        return (0, mem)
-    (r, m, qp) = quiescence_selection_test_wo_ilp(ts, q, max_q, min_q, parsec_theta, parsec_block)
-    return (r, m)
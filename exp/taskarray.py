@@ -0,0 +1,136 @@
+from __future__ import division
+
+import numpy as np
+
+from schedcat.model.tasks import SporadicTask, TaskSystem
+import schedcat.model.resources as resources
+
+# Codes of the mc_type attribute of the MC experiments (index = code).
+MC_TYPES = (None, "reader", "writer")
+
+class TaskArray(object):
+    """Struct-of-arrays form of a generated taskset.
+
+    Task i is described by entry i of every array: cost, period, deadline,
+    partition, priority (the preemption level), id, the read/write request
+    counts and lengths of resource 0 (the only resource the generators use)
+    and the code of its mc_type (see MC_TYPES). The arrays keep the order of
+    the TaskSystem they were built from.
+    """
+    __slots__ = ('cost', 'period', 'deadline', 'partition', 'priority', 'id',
+                 'num_reads', 'read_length', 'num_writes', 'write_length',
+                 'mc_type', 'matrix')
+
+    def __init__(self, cost, period, deadline, partition, priority, id,
+                 num_reads, read_length, num_writes, write_length, mc_type):
+        self.cost = cost
+        self.period = period
+        self.deadline = deadline
+        self.partition = partition
+        self.priority = priority
+        self.id = id
+        self.num_reads = num_reads
+        self.read_length = read_length
+        self.num_writes = num_writes
+        self.write_length = write_length
+        self.mc_type = mc_type
+        # see partition_matrix()
+        self.matrix = False
+
+    def __len__(self):
+        return len(self.cost)
+
+    @staticmethod
+    def from_columns(cost, period, partition):
+        """The tasks with costs cost, implicit deadlines and periods period on
+        the partitions partition, without requests. Like the generators, the
+        arrays are in priority order and the ids count from 1."""
+        n = len(cost)
+        requests = np.zeros((4, n), dtype=np.int64)
+        return TaskArray(cost, period, period.copy(), partition,
+                         np.arange(n, dtype=np.int32),
+                         np.arange(1, n + 1, dtype=np.int32),
+                         requests[0], requests[1], requests[2], requests[3],
+                         np.zeros(n, dtype=np.int8))
+
+    @staticmethod
+    def from_taskset(ts):
+        n = len(ts)
+        partition = np.zeros(n, dtype=np.int32)
+        priority = np.arange(n, dtype=np.int32)
+        id = np.zeros(n, dtype=np.int32)
+        requests = np.zeros((4, n), dtype=np.int64)
+        mc_type = np.zeros(n, dtype=np.int8)
+        for (i, t) in enumerate(ts):
+            attrs = t.__dict__
+            partition[i] = attrs.get('partition', 0)
+            priority[i] = attrs.get('preemption_level', i)
+            id[i] = attrs.get('id') or 0
+            if 'resmodel' in attrs and 0 in t.resmodel:
+                r = t.resmodel[0]
+                requests[:, i] = (r.max_reads, r.max_read_length,
+                                  r.max_writes, r.max_write_length)
+            mc_type[i] = MC_TYPES.index(attrs.get('mc_type'))
+        return TaskArray(np.array([t.cost for t in ts]),
+                         np.array([t.period for t in ts]),
+                         np.array([t.deadline for t in ts]),
+                         partition, priority, id,
+                         requests[0], requests[1], requests[2], requests[3],
+                         mc_type)
+
+    def to_taskset(self):
+        """The TaskSystem (with resource model) described by the arrays. It
+        keeps the arrays as its task_array attribute: the tests only
+        analyze overlays of a generated taskset (see analysis_view()), so
+        the two stay in sync and the pre-filters can use the arrays."""
+        ts = TaskSystem([SporadicTask(c, p, d) for (c, p, d) in
+                         zip(self.cost.tolist(), self.period.tolist(),
+                             self.deadline.tolist())])
+        resources.initialize_resource_model(ts)
+        rows = zip(self.partition.tolist(), self.priority.tolist(),
+                   self.id.tolist(), self.num_reads.tolist(),
+                   self.read_length.tolist(), self.num_writes.tolist(),
+                   self.write_length.tolist(), self.mc_type.tolist())
+        for (t, (part, prio, id, nr, rl, nw, wl, mc)) in zip(ts, rows):
+            t.partition = part
+            t.preemption_level = prio
+            t.id = id
+            for _ in xrange(nr):
+                t.resmodel[0].add_read_request(rl)
+            for _ in xrange(nw):
+                t.resmodel[0].add_write_request(wl)
+            if mc:
+                t.mc_type = MC_TYPES[mc]
+        ts.task_array = self
+        return ts
+
+    def add_read_request(self, i, length):
+        self.num_reads[i] += 1
+        self.read_length[i] = max(self.read_length[i], length)
+
+    def add_write_request(self, i, length):
+        self.num_writes[i] += 1
+        self.write_length[i] = max(self.write_length[i], length)
+
+    def partition_tasks(self, partition):
+        """ Indices of the tasks of partition, in priority order. """
+        return np.flatnonzero(self.partition == partition)
+
+    def partition_matrix(self):
+        """The indices of the tasks as a matrix with one row per partition,
+        in priority order, or None if the partitions differ in size."""
+        if self.matrix is False:
+            counts = np.bincount(self.partition)
+            counts = counts[counts > 0]
+            self.matrix = None
+            if len(counts) and (counts == counts[0]).all():
+                order = np.argsort(self.partition, kind='mergesort')
+                self.matrix = order.reshape(len(counts), counts[0])
+        return self.matrix
+
+    def utilization(self):
+        return self.cost / self.period
+
+    def partition_utilization(self):
+        """ Utilization of every partition, indexed by partition. """
+        return np.bincount(self.partition, weights=self.utilization())
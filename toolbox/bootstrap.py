@@ -1,24 +1,56 @@
 from __future__ import division
 from __future__ import absolute_import
 
-import random
-
 import numpy as np
 from scipy.stats import scoreatpercentile
 
 import toolbox.stats as stats
 
-def bootstrap(samples, stat=stats.mean, iterations=1000):
-    collected = []
-
-    for _  in xrange(iterations):
-        resample = [random.choice(samples) for _ in samples]
-        collected.append(stat(resample))
-
-    return  np.array(collected)
-
-def confidence_interval(samples, stat=stats.mean, iterations=1000, level=0.95):
-    observed = bootstrap(samples, stat, iterations)
+# Upper bound on the number of resample indices drawn at once (memory).
+CHUNK_SIZE = 1 << 22
+
+# Statistics of toolbox.stats evaluated on a matrix of resamples, one per row.
+VECTORIZED = {
+    stats.mean   : lambda m: m.mean(axis=1),
+    stats.median : lambda m: np.median(m, axis=1),
+}
+
+def bootstrap(samples, stat=stats.mean, iterations=1000, rng=np.random):
+    """The statistic stat of iterations resamples of samples.
+
+    The indices of the resamples are drawn from rng (a numpy RandomState or
+    the numpy.random module) as an integer matrix, CHUNK_SIZE indices at a
+    time. Statistics in VECTORIZED are evaluated along the rows of the
+    matrix; any other stat is called on every resample (as a list).
+
+    The mean of samples with few distinct values (e.g., 0/1 schedulability
+    results) is bootstrapped from the multinomial counts of the values
+    instead, which has the same distribution and does not depend on n.
+    """
+    data = np.asarray(samples)
+    n = len(data)
+    if stat is stats.mean and n:
+        (values, freq) = np.unique(data, return_counts=True)
+        if len(values) * 4 <= n:
+            counts = rng.multinomial(n, freq / n, size=iterations)
+            return counts.dot(values) / n
+    vstat = VECTORIZED.get(stat)
+    rows = max(1, CHUNK_SIZE // max(n, 1))
+
+    collected = np.empty(iterations)
+    for first in xrange(0, iterations, rows):
+        count = min(rows, iterations - first)
+        resamples = data[rng.randint(0, n, size=(count, n))]
+        if vstat:
+            collected[first:first + count] = vstat(resamples)
+        else:
+            collected[first:first + count] = [stat(r) for r in resamples.tolist()]
+
+    return collected
+
+def confidence_interval(samples, stat=stats.mean, iterations=1000, level=0.95,
+                        rng=np.random):
+    observed = bootstrap(samples, stat, iterations, rng)
 
     perc = (1 - level) / 2
 
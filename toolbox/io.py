@@ -195,6 +195,9 @@ class Config(dict):
             raise KeyError, key
 
     def __getattr__(self, key):
+        if key.startswith('__'):
+            # special methods (e.g., pickle's __getstate__) are not parameters
+            raise AttributeError, key
         return self[key]
 
     def __setattr__(self, key, value):
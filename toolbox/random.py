@@ -1,5 +1,6 @@
 from  __future__ import absolute_import
 
+import os
 import random
 
 from .git import path_to_repository
@@ -18,7 +19,15 @@ def load_state(fname):
     f.close()
     random.setstate(s)
 
+STD_STATE_FILE = 'data/random.conf'
+STD_SEED = 0
+
 def load_std_state():
     """For repeatability, it may be beneficial to start from
-    a known 'standard' PRNG state."""
-    load_random_state(path_to_repository() + '/data/random.conf')
+    a known 'standard' PRNG state: the one saved in data/random.conf
+    (see save_state()), or the state after seeding with STD_SEED."""
+    fname = os.path.join(path_to_repository(), STD_STATE_FILE)
+    if os.path.exists(fname):
+        load_state(fname)
+    else:
+        random.seed(STD_SEED)
@@ -2,30 +2,188 @@
 # Caching confidence intervals is possible because all samples are either 0 or 1,
 # so only the number of schedulable task sets and the total number of schedulable
 # task sets affect the confidence value (of the mean).
+#
+# The interval of k schedulable task sets out of n is either the exact
+# Clopper-Pearson interval (default), the Wilson score interval, or a
+# bootstrap interval (the original method, see set_method()). The binomial
+# intervals come from a table of all (k, n) up to some n that is computed on
+# first use, stored next to the bootstrap cache and memory-mapped read-only,
+# so that all processes of a run share one copy. A lookup beyond the table
+# extends it (to at least twice its size). Bootstrap intervals are cached
+# in an sqlite store (see below).
+
+from __future__ import division
 
 import fcntl
 import os
 import sys
 import pickle
+import sqlite3
+
+import numpy as np
+from scipy.stats import beta, norm
 
 from toolbox.stats import mean
 import toolbox.bootstrap as boot
 import toolbox.git as git
 
+CI_METHODS = ('clopper-pearson', 'wilson', 'bootstrap')
+CI_METHOD = 'clopper-pearson'
+CI_LEVEL = 0.95
+
+# Smallest n covered by a computed interval table.
+TABLE_MIN_SAMPLES = 1000
+
+def clopper_pearson(k, n, level=CI_LEVEL):
+    """ Exact interval of k successes out of n (arrays of k and n). """
+    k = np.asarray(k, dtype=float)
+    n = np.asarray(n, dtype=float)
+    alpha = 1 - level
+    with np.errstate(invalid='ignore', divide='ignore'):
+        lower = np.where(k > 0, beta.ppf(alpha / 2, k, n - k + 1), 0.0)
+        upper = np.where(k < n, beta.ppf(1 - alpha / 2, k + 1, n - k), 1.0)
+    return (lower, upper)
+
+def wilson(k, n, level=CI_LEVEL):
+    """ Wilson score interval of k successes out of n (arrays of k and n). """
+    k = np.asarray(k, dtype=float)
+    n = np.asarray(n, dtype=float)
+    z = norm.ppf(1 - (1 - level) / 2)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        p = k / n
+        denom = 1 + z * z / n
+        center = (p + z * z / (2 * n)) / denom
+        half = z * np.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denom
+        lower = np.where(k > 0, np.clip(center - half, 0.0, 1.0), 0.0)
+        upper = np.where(k < n, np.clip(center + half, 0.0, 1.0), 1.0)
+    return (lower, upper)
+
+INTERVALS = {
+    'clopper-pearson' : clopper_pearson,
+    'wilson'          : wilson,
+}
+
+def table_offset(n):
+    """ Index of (0, n) in a table of all (k, n), row by row. """
+    return n * (n + 1) // 2
+
+class IntervalTable(object):
+    """The intervals of all (k, n) with n <= self.size, for one method and
+    level, backed by the (memory-mapped) file fname (None: in memory)."""
+
+    def __init__(self, method, level=CI_LEVEL, fname=None):
+        self.method = method
+        self.level = level
+        self.fname = fname
+        self.table = None
+        self.size = -1
+
+    def __call__(self, k, n):
+        if n > self.size:
+            self.extend(n)
+        (lower, upper) = self.table[table_offset(n) + k]
+        return (float(lower), float(upper))
+
+    def rows(self, table):
+        # the table holds (size + 1) * (size + 2) / 2 entries
+        return int(round((np.sqrt(8 * len(table) + 1) - 1) / 2)) - 1
+
+    def load(self):
+        try:
+            table = np.load(self.fname, mmap_mode='r')
+        except Exception:
+            return
+        if table.ndim == 2 and self.rows(table) > self.size:
+            self.table = table
+            self.size = self.rows(table)
+
+    def extend(self, n):
+        if self.fname and os.path.exists(self.fname):
+            # maybe another process extended it already
+            self.load()
+            if n <= self.size:
+                return
+        size = max(n, 2 * self.size, TABLE_MIN_SAMPLES)
+        # only the rows self.size + 1 ... size are new
+        ns = np.repeat(np.arange(self.size + 1, size + 1),
+                       np.arange(self.size + 2, size + 2))
+        ks = np.arange(table_offset(self.size + 1), table_offset(size + 1)) \
+             - table_offset(ns)
+        (lower, upper) = INTERVALS[self.method](ks, ns, self.level)
+        rows = np.column_stack((lower, upper))
+        if self.table is not None:
+            rows = np.concatenate((self.table, rows))
+        if not (self.fname and self.save(rows)):
+            self.table = rows
+            self.size = size
+
+    def save(self, table):
+        # write a private copy and rename it: readers map either the old or
+        # the new table, never a partial one
+        tmp = '%s.%d.tmp' % (self.fname, os.getpid())
+        try:
+            with open(tmp, 'wb') as f:
+                np.save(f, table)
+            os.rename(tmp, self.fname)
+        except (IOError, OSError) as err:
+            print >> sys.stderr, "[!!] sci_cache.IntervalTable.save: %s" % err
+            return False
+        self.load()
+        return True
+
+def table_file(method, level=CI_LEVEL):
+    return os.path.join(git.path_to_repository(),
+                        '.sci_ci_%s_%g.npy' % (method, level))
+
+interval_tables = {}
+
+def interval_table(method=None, level=None):
+    method = method or CI_METHOD
+    level = level or CI_LEVEL
+    key = (method, level)
+    if not key in interval_tables:
+        interval_tables[key] = IntervalTable(method, level, table_file(method, level))
+    return interval_tables[key]
+
+def set_method(method):
+    """ Select the interval of confidence_interval() (see CI_METHODS). """
+    global CI_METHOD
+    if not method in CI_METHODS:
+        raise ValueError, "unknown confidence interval method: %s" % method
+    CI_METHOD = method
+
 confidence_interval_cache = {}
 
-def confidence_interval(sample):
+def confidence_interval(sample, method=None):
     num_schedulable = sum(sample)
     total_tasksets  = len(sample)
+    method = method or CI_METHOD
+    if method != 'bootstrap':
+        return interval_table(method)(num_schedulable, total_tasksets)
     key = (num_schedulable, total_tasksets)
     if not key in confidence_interval_cache:
-        ci = boot.confidence_interval(sample, stat=mean, iterations=10000)
+        ci = stored_interval(key)
+        if ci is None:
+            # resample from a generator of its own: the interval depends only
+            # on the key, and the random state of the experiment is left alone
+            rng = np.random.RandomState(hash(key) & 0xffffffff)
+            ci = boot.confidence_interval(sample, stat=mean, iterations=10000, rng=rng)
+            store_interval(key, ci)
         confidence_interval_cache[key] = ci
     return confidence_interval_cache[key]
 
 
-CACHE_FNAME = ".sci_cache.bin"
+# Bootstrap intervals are kept in an sqlite store keyed by (k, n). Readers
+# do not block (write-ahead log), and every interval is inserted atomically
+# and at most once, so concurrent processes never rewrite each other's work.
+# A cache in the old format (a pickled dict in .sci_cache.bin next to the
+# store) is imported on first use and renamed to .sci_cache.bin.migrated.
+# confidence_interval() looks every interval up in the store of DEFAULT_CACHE
+# before computing it and stores the ones it computes.
+
+CACHE_FNAME = ".sci_cache.sqlite"
 DEFAULT_CACHE = os.path.join(git.path_to_repository(), CACHE_FNAME)
+LEGACY_CACHE_FNAME = ".sci_cache.bin"
 
 def lock(fname):
     f = open(fname + '.lck', 'a')
@@ -55,38 +213,81 @@ def save_object(fname, obj):
         print >> sys.stderr, "[!!] sci_cache.save_object: %s" % err
         cache = None
 
-def load_cache(fname = DEFAULT_CACHE):
-    global confidence_interval_cache
-    if os.path.exists(fname):
-        lck = lock(fname)
-        confidence_interval_cache = load_object(fname)
-        if not confidence_interval_cache:
-            confidence_interval_cache = {}
-        unlock(lck)
+def open_store(fname = DEFAULT_CACHE):
+    db = sqlite3.connect(fname, timeout=60)
+    db.execute('PRAGMA journal_mode=WAL')
+    db.execute('CREATE TABLE IF NOT EXISTS intervals ('
+               'k INTEGER, n INTEGER, lower REAL, upper REAL, '
+               'PRIMARY KEY (k, n))')
+    migrate_legacy(db, os.path.join(os.path.dirname(fname), LEGACY_CACHE_FNAME))
+    return db
 
-def save_cache(fname = DEFAULT_CACHE):
-    global confidence_interval_cache
+def insert_intervals(db, cache):
+    with db:
+        db.executemany('INSERT OR IGNORE INTO intervals VALUES (?, ?, ?, ?)',
+                       [(int(k), int(n), float(lo), float(hi))
+                        for ((k, n), (lo, hi)) in cache.iteritems()])
 
-    lck = lock(fname)
+def migrate_legacy(db, fname):
+    if not os.path.exists(fname):
+        return
+    legacy = load_object(fname)
+    if legacy:
+        insert_intervals(db, legacy)
+    try:
+        os.rename(fname, fname + '.migrated')
+    except OSError:
+        # another process migrated it concurrently
+        pass
+
+# Connections of this process to the stores, by (file, pid): a connection
+# must not be shared with forked workers.
+stores = {}
 
-    existing = None
-    if os.path.exists(fname):
-        existing = load_object(fname)
+def store(fname = DEFAULT_CACHE):
+    key = (fname, os.getpid())
+    if not key in stores:
+        stores[key] = open_store(fname)
+    return stores[key]
 
-    if not existing:
-        existing = {}
+def stored_interval(key, fname = DEFAULT_CACHE):
+    """ The stored interval of key = (k, n), or None. """
+    try:
+        row = store(fname).execute(
+            'SELECT lower, upper FROM intervals WHERE k = ? AND n = ?',
+            (int(key[0]), int(key[1]))).fetchone()
+    except sqlite3.Error as err:
+        print >> sys.stderr, "[!!] sci_cache.stored_interval: %s" % err
+        return None
+    return tuple(row) if row else None
 
-    confidence_interval_cache.update(existing)
+def store_interval(key, ci, fname = DEFAULT_CACHE):
+    try:
+        insert_intervals(store(fname), {key: ci})
+    except sqlite3.Error as err:
+        print >> sys.stderr, "[!!] sci_cache.store_interval: %s" % err
 
-    save_object(fname, confidence_interval_cache)
+def load_cache(fname = DEFAULT_CACHE):
+    global confidence_interval_cache
+    if os.path.exists(fname) or \
+       os.path.exists(os.path.join(os.path.dirname(fname), LEGACY_CACHE_FNAME)):
+        db = open_store(fname)
+        for (k, n, lo, hi) in db.execute('SELECT k, n, lower, upper FROM intervals'):
+            confidence_interval_cache[(k, n)] = (lo, hi)
+        db.close()
 
-    unlock(lck)
+def save_cache(fname = DEFAULT_CACHE):
+    db = open_store(fname)
+    insert_intervals(db, confidence_interval_cache)
+    db.close()
 
 def populate_cache(samples, fname = DEFAULT_CACHE):
+    if CI_METHOD != 'bootstrap':
+        interval_table().extend(samples)
+        return
     load_cache(fname)
     for i in xrange(samples + 1):
         vals = [0] * i  + [1] * (samples - i)
         assert len(vals) == samples
         print i, '->', mean(vals), confidence_interval(vals)
     save_cache(fname)
-